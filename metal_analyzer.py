@@ -1,15 +1,18 @@
 import pandas as pd
 import numpy as np
-import yfinance as yf
 import requests
-import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import logging
-from typing import Dict, Tuple, List
-import talib
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Dict, Tuple, List, Optional
 import os
 import sys
-import pytz
+from zoneinfo import ZoneInfo
 
 # تنظیمات پیشرفته لاگ‌گیری
 logging.basicConfig(
@@ -17,14 +20,210 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# تایم‌زون ایران - یک بار ساخته می‌شود
+IRAN_TZ = ZoneInfo('Asia/Tehran')
+
+class Signal(IntEnum):
+    """کد سیگنال هر اندیکاتور"""
+    SELL = -1
+    NEUTRAL = 0
+    BUY = 1
+
+@dataclass(frozen=True)
+class OHLC:
+    """داده‌های قیمت به صورت یک آرایه numpy برای هر ستون"""
+    ts: np.ndarray  # زمان شروع کندل - ثانیه یونیکس (UTC)
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    
+    def __len__(self) -> int:
+        return len(self.close)
+    
+    def select(self, mask: np.ndarray) -> 'OHLC':
+        """انتخاب کندل‌ها با ماسک بولی"""
+        return OHLC(self.ts[mask], self.open[mask], self.high[mask],
+                    self.low[mask], self.close[mask], self.volume[mask])
+    
+    def merge_buckets(self, seconds: int, offset: int = 0) -> 'OHLC':
+        """ادغام کندل‌های هم‌بازه - باز اولین، سقف بیشینه، کف کمینه و بسته آخرین ردیف"""
+        bucket = (self.ts + offset) // seconds
+        new_bucket = np.r_[True, bucket[1:] != bucket[:-1]]
+        if new_bucket.all():
+            return self
+        starts = np.flatnonzero(new_bucket)
+        ends = np.r_[starts[1:], len(bucket)] - 1
+        return OHLC(self.ts[starts], self.open[starts],
+                    np.fmax.reduceat(self.high, starts), np.fmin.reduceat(self.low, starts),
+                    self.close[ends], np.add.reduceat(np.nan_to_num(self.volume), starts))
+    
+    @classmethod
+    def from_arrays(cls, ts, open, high, low, close, volume) -> 'OHLC':
+        """ساخت از آرایه‌های خام - کندل‌های بدون قیمت بسته شدن حذف می‌شوند"""
+        data = cls(
+            np.asarray(ts, dtype=np.int64),
+            *(np.asarray(column, dtype=np.float64) for column in (open, high, low, close, volume))
+        )
+        return data.select(~np.isnan(data.close))
+    
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> 'OHLC':
+        """تبدیل خروجی DataFrame کتابخانه yfinance"""
+        index = frame.index if frame.index.tz is not None else frame.index.tz_localize('UTC')
+        return cls.from_arrays(
+            index.tz_convert('UTC').tz_localize(None).to_numpy().astype('datetime64[s]').astype(np.int64),
+            *(frame[column].to_numpy(dtype=np.float64) for column in ('Open', 'High', 'Low', 'Close', 'Volume'))
+        )
+
+def _signal_code(buy, sell) -> np.ndarray:
+    """تبدیل شرط‌های خرید/فروش به کد سیگنال"""
+    return np.where(buy, Signal.BUY, np.where(sell, Signal.SELL, Signal.NEUTRAL)).astype(np.int8)
+
+def score_signals(rsi, sma_20, sma_50, current_price, macd_hist, bb_position, trend_strength
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """امتیازدهی برداری سیگنال‌ها - ورودی‌ها اسکالر (یک کندل) یا آرایه (بک‌تست چند کندل)
+
+    خروجی: کد سیگنال هر اندیکاتور (آخرین محور به ترتیب RSI، MA، MACD، Bollinger، Trend)،
+    جهت کلی به صورت کد Signal و درصد اطمینان
+    """
+    rsi, sma_20, sma_50, current_price, macd_hist, bb_position, trend_strength = np.broadcast_arrays(
+        rsi, sma_20, sma_50, current_price, macd_hist, bb_position, trend_strength
+    )
+    codes = np.stack([
+        _signal_code(rsi < 30, rsi > 70),
+        _signal_code((sma_20 > sma_50) & (current_price > sma_20), (sma_20 < sma_50) & (current_price < sma_20)),
+        _signal_code(macd_hist > 0, macd_hist < 0),
+        _signal_code(bb_position < 0.2, bb_position > 0.8),
+        _signal_code(trend_strength > 0.1, trend_strength < -0.1)
+    ], axis=-1)
+    
+    buy_signals = np.count_nonzero(codes > 0, axis=-1)
+    sell_signals = np.count_nonzero(codes < 0, axis=-1)
+    direction = np.sign(buy_signals - sell_signals).astype(np.int8)
+    
+    # هر چه تعداد اندیکاتورهای تاییدکننده بیشتر باشد اطمینان بالاتر است
+    confirmation_count = buy_signals + sell_signals
+    total_indicators = codes.shape[-1]
+    confidence = np.select(
+        [confirmation_count == total_indicators,
+         confirmation_count == total_indicators - 1,
+         confirmation_count == total_indicators - 2],
+        [80, 70, 60],
+        default=50
+    )
+    return codes, direction, confidence
+
+def _ema(values: np.ndarray, period: int) -> np.ndarray:
+    """میانگین متحرک نمایی با مقدار اولیه SMA (مشابه TA-Lib)"""
+    alpha = 2.0 / (period + 1)
+    result = np.empty(len(values) - period + 1)
+    result[0] = values[:period].mean()
+    for i, value in enumerate(values[period:].tolist(), start=1):
+        result[i] = result[i - 1] + alpha * (value - result[i - 1])
+    return result
+
+def _wilder_rsi(values: np.ndarray, period: int = 14) -> float:
+    """آخرین مقدار RSI با هموارسازی وایلدر (مشابه TA-Lib)"""
+    delta = np.diff(values)
+    gains = np.clip(delta, 0, None)
+    losses = np.clip(-delta, 0, None)
+    avg_gain = gains[:period].mean()
+    avg_loss = losses[:period].mean()
+    for gain, loss in zip(gains[period:].tolist(), losses[period:].tolist()):
+        avg_gain = (avg_gain * (period - 1) + gain) / period
+        avg_loss = (avg_loss * (period - 1) + loss) / period
+    
+    # در بازار بدون تغییر قیمت RSI خنثی در نظر گرفته می‌شود
+    total = avg_gain + avg_loss
+    return 100 * avg_gain / total if total > 0 else 50.0
+
+@functools.cache
+def _yf():
+    """بارگذاری yfinance فقط در زمان نیاز"""
+    import yfinance
+    return yfinance
+
 class MetalMarketAnalyzer:
+    # تعداد کندل‌های لازم برای همگرایی اندیکاتورها (SMA50 و گرم شدن RSI/MACD)
+    INDICATOR_LOOKBACK = 200
+    # تعطیلات رسمی بازار (YYYY-MM-DD) - برای فارکس تعطیلی خاصی نداریم
+    HOLIDAYS: List[str] = []
+    # ترتیب اندیکاتورها در امتیازدهی سیگنال و نام فارسی کد هر سیگنال
+    SIGNAL_INDICATORS = ('RSI', 'MA', 'MACD', 'Bollinger', 'Trend')
+    SIGNAL_NAMES = {Signal.BUY: "خرید", Signal.NEUTRAL: "خنثی", Signal.SELL: "فروش"}
+    # ساعات تحلیل - هر 4 ساعت از 5 صبح به وقت ایران
+    ANALYSIS_HOURS = (5, 9, 13, 17, 21)
+    # بخش‌های ثابت پیام‌ها که یک بار ساخته می‌شوند
+    NEXT_UPDATE_LINE = "🔄 به روزرسانی بعدی: 4 ساعت دیگر"
+    DAILY_HEADER = "📊 گزارش روزانه فلزات 📊"
+    DAILY_FOOTER = NEXT_UPDATE_LINE + "\n#گزارش_روزانه #فلزات"
+    # تحلیل‌ها تا این طول در یک پیام ارسال می‌شوند (سقف تلگرام 4096 کاراکتر است)
+    COMBINED_MESSAGE_LIMIT = 4000
+    MESSAGE_SEPARATOR = "\n\n———\n\n"
+    # قالب پیام تحلیل که یک بار در زمان بارگذاری کلاس ساخته می‌شود
+    ANALYSIS_TEMPLATE = (
+        "🔍 تحلیل {metal_upper} - تایم‌فریم 15 دقیقه\n"
+        "\n"
+        "💰 قیمت فعلی: ${current_price:.2f}\n"
+        "📊 جهت بازار: {market_direction}\n"
+        "🎯 عمل پیشنهادی: {action}\n"
+        "🛡️ اطمینان تحلیل: {confidence}%\n"
+        "\n"
+        "📈 جزئیات اندیکاتورها:{details}\n"
+        "\n"
+        "📊 RSI: {rsi:.1f}\n"
+        "📊 موقعیت در بولینگر: {bb_position:.1f}%\n"
+        "💪 قدرت روند: {trend_strength:.1f}%\n"
+        "\n"
+        "⏰ زمان تحلیل: {time} (به وقت ایران)\n"
+        + NEXT_UPDATE_LINE +
+        "\n#{metal_name}_تحلیل #سیگنال"
+    )
+    # API نمودار یاهو - یاهو درخواست‌های بدون User-Agent مرورگر را رد می‌کند
+    CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
+    # طول هر تایم‌فریم به ثانیه برای ادغام ردیف قیمت لحظه‌ای با کندل خودش
+    INTERVAL_SECONDS = {'15m': 15 * 60, '1h': 60 * 60, '1d': 24 * 60 * 60}
+    CHART_HEADERS = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'}
+    
     def __init__(self):
         # دریافت توکن و آیدی از environment variables
         self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
         self.channel_id = os.getenv('TELEGRAM_CHANNEL_ID')
         
-        # تنظیم تایم‌زون ایران
-        self.iran_tz = pytz.timezone('Asia/Tehran')
+        # تبدیل یک‌باره تعطیلات به مجموعه تاریخ برای جستجوی سریع
+        self._holidays = frozenset(datetime.strptime(d, '%Y-%m-%d').date() for d in self.HOLIDAYS)
+        
+        # نشست مشترک HTTP برای استفاده مجدد از اتصال (keep-alive) به تلگرام و یاهو
+        self.session = requests.Session()
+        self.session.headers.update({'Content-Type': 'application/x-www-form-urlencoded'})
+        # یاهو و سایر درخواست‌های GET: خطاهای اتصال/خواندن و پاسخ‌های محدودیت/سرور تکرار می‌شوند
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=4,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=frozenset({'GET'}),
+                raise_on_status=False
+            )
+        ))
+        # تلگرام: فقط خطای اتصال و پاسخ 429 تکرار می‌شود که در آن‌ها پیام قطعاً ارسال نشده است.
+        # پاسخ 5xx یا timeout خواندن ممکن است بعد از انتشار پیام رخ دهد و تکرار آن پیام تکراری می‌سازد
+        self.session.mount('https://api.telegram.org/', HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=1,
+            max_retries=Retry(
+                total=3,
+                read=False,
+                backoff_factor=0.3,
+                status_forcelist=[429],
+                allowed_methods=frozenset({'GET', 'POST'}),
+                raise_on_status=False
+            )
+        ))
         
         # اگر channel_id با @ شروع شود، باید به عدد تبدیل شود
         if self.channel_id and self.channel_id.startswith('@'):
@@ -42,16 +241,26 @@ class MetalMarketAnalyzer:
             'gold': 'GC=F',
             'silver': 'SI=F'
         }
+        
+        # کش داده‌های قیمت در طول یک اجرا - کلید: (نماد، دوره، تایم‌فریم)
+        self._price_cache: Dict[Tuple[str, str, str], OHLC] = {}
+        
+        # جدول زمان‌بندی به وقت ایران - کلید: (ساعت، 0 یا 30 دقیقه)
+        # گزارش روزانه ساعت 4:30 صبح و تحلیل در کل ساعت‌های ANALYSIS_HOURS
+        self.schedule = {(4, 30): self._daily_summary_job}
+        for hour in self.ANALYSIS_HOURS:
+            self.schedule[(hour, 0)] = self._analysis_job
+            self.schedule[(hour, 30)] = self._analysis_job
     
     def get_iran_time(self):
         """دریافت زمان فعلی ایران"""
-        return datetime.now(self.iran_tz)
+        return datetime.now(IRAN_TZ)
     
     def convert_to_chat_id(self, channel_username: str) -> str:
         """تبدیل آیدی کانال به Chat ID عددی"""
         try:
             url = f"https://api.telegram.org/bot{self.bot_token}/getUpdates"
-            response = requests.get(url, timeout=10)
+            response = self.session.get(url, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -72,73 +281,156 @@ class MetalMarketAnalyzer:
             return channel_username
     
     def is_holiday(self, date: datetime) -> bool:
-        """بررسی تعطیلی بازار - برای فارکس تعطیلی خاصی نداریم"""
-        return False
+        """بررسی تعطیلی بازار"""
+        return date.date() in self._holidays
     
     def is_weekend(self, date: datetime) -> bool:
         """بررسی آخر هفته - فارکس فقط جمعه و شنبه بسته است"""
         return date.weekday() >= 5  # 5=شنبه, 6=یکشنبه
     
-    def should_analyze(self) -> bool:
+    def should_analyze(self, now: Optional[datetime] = None) -> bool:
         """بررسی زمان تحلیل - برای فارکس محدودیت زمانی نداریم"""
-        now = self.get_iran_time()
+        if now is None:
+            now = self.get_iran_time()
         
         # فقط آخر هفته تحلیل نکن
         if self.is_weekend(now):
             logging.info("امروز بازار فارکس تعطیل است (آخر هفته)")
             return False
+        
+        if self.is_holiday(now):
+            logging.info("امروز بازار فارکس تعطیل است (تعطیلی رسمی)")
+            return False
             
         return True
     
-    def get_metal_data(self, symbol: str, period: str = '1mo') -> pd.DataFrame:
+    def _fetch_ohlc_fast(self, symbol: str, period: str, interval: str = '15m') -> Optional[OHLC]:
+        """دریافت مستقیم داده‌های قیمت از API نمودار یاهو"""
+        try:
+            response = self.session.get(
+                self.CHART_URL.format(symbol=symbol),
+                params={'range': period, 'interval': interval},
+                headers=self.CHART_HEADERS,
+                timeout=10
+            )
+            response.raise_for_status()
+            result = response.json()['chart']['result'][0]
+            quote = result['indicators']['quote'][0]
+            
+            # ساخت مستقیم ستون‌ها از آرایه‌های JSON (مقادیر null به NaN تبدیل می‌شوند)
+            data = OHLC.from_arrays(
+                result['timestamp'],
+                *(quote[column] for column in ('open', 'high', 'low', 'close', 'volume'))
+            )
+            # یاهو گاهی قیمت لحظه‌ای را به صورت ردیف جدا داخل بازه آخرین کندل برمی‌گرداند؛
+            # مانند yfinance این ردیف با کندل خودش ادغام می‌شود (بازه‌ها به وقت بورس)
+            seconds = self.INTERVAL_SECONDS.get(interval)
+            if seconds is None:
+                return data
+            return data.merge_buckets(seconds, result.get('meta', {}).get('gmtoffset', 0))
+        except Exception as e:
+            logging.warning(f"خطا در دریافت مستقیم داده برای {symbol}: {e}")
+            return None
+    
+    def _bulk_fetch(self, period: str, interval: str = '15m'):
+        """دریافت یکجای داده‌های همه فلزات"""
+        symbols = list(self.metals.values())
+        
+        # درخواست نمادها به صورت هم‌زمان ارسال می‌شود
+        with ThreadPoolExecutor(max_workers=len(symbols)) as executor:
+            fetched = executor.map(lambda symbol: self._fetch_ohlc_fast(symbol, period, interval), symbols)
+        
+        missing = []
+        for symbol, data in zip(symbols, fetched):
+            if data is not None and len(data) > 0:
+                self._price_cache[(symbol, period, interval)] = data
+            else:
+                missing.append(symbol)
+        
+        if not missing:
+            return
+        
+        # برای نمادهایی که دریافت مستقیم ناموفق بود از yfinance استفاده می‌شود
+        try:
+            logging.info(f"دریافت یکجای داده برای {missing} با دوره {period}")
+            data = _yf().download(
+                tickers=' '.join(missing),
+                period=period,
+                interval=interval,
+                group_by='ticker',
+                threads=True,
+                progress=False
+            )
+            for symbol in missing:
+                if symbol in data.columns.get_level_values(0):
+                    # ردیف‌های خالی ناشی از ادغام زمان‌های دو نماد حذف می‌شوند
+                    self._price_cache[(symbol, period, interval)] = OHLC.from_frame(data[symbol])
+        except Exception as e:
+            logging.error(f"خطا در دریافت یکجای داده‌ها: {e}")
+    
+    def get_metal_data(self, symbol: str, period: str = '1mo', interval: str = '15m') -> Optional[OHLC]:
         """دریافت داده‌های فلز"""
+        cached = self._price_cache.get((symbol, period, interval))
+        if cached is not None and len(cached) > 0:
+            return cached
+        
+        data = self._fetch_ohlc_fast(symbol, period, interval)
+        if data is not None and len(data) > 0:
+            self._price_cache[(symbol, period, interval)] = data
+            return data
+        
         try:
             logging.info(f"دریافت داده برای {symbol} با دوره {period}")
-            ticker = yf.Ticker(symbol)
-            data = ticker.history(period=period, interval='15m')
+            ticker = _yf().Ticker(symbol)
+            data = ticker.history(period=period, interval=interval)
             logging.info(f"تعداد داده‌های دریافت شده: {len(data)}")
-            return data
+            return OHLC.from_frame(data)
         except Exception as e:
             logging.error(f"خطا در دریافت داده برای {symbol}: {e}")
             return None
     
-    def calculate_indicators(self, data: pd.DataFrame) -> Dict:
+    def calculate_indicators(self, data: OHLC) -> Dict:
         """محاسبه اندیکاتورهای تکنیکال"""
         if len(data) < 50:
             logging.warning("داده کافی برای محاسبه اندیکاتورها موجود نیست")
             return {}
         
         try:
-            close_prices = data['Close'].values
-            high_prices = data['High'].values
-            low_prices = data['Low'].values
+            # فقط آخرین مقدار هر اندیکاتور لازم است، پس محاسبه روی کندل‌های اخیر انجام می‌شود
+            # ستون‌ها از قبل آرایه پیوسته float64 هستند و برش آن‌ها کپی نمی‌سازد
+            close_prices = data.close[-self.INDICATOR_LOOKBACK:]
             
             # محاسبه اندیکاتورها
             indicators = {}
             
             # RSI
-            rsi = talib.RSI(close_prices, timeperiod=14)
-            indicators['rsi'] = rsi[-1] if len(rsi) > 0 else 50
-            
-            # Moving Averages
-            sma_20 = talib.SMA(close_prices, timeperiod=20)
-            sma_50 = talib.SMA(close_prices, timeperiod=50)
-            indicators['sma_20'] = sma_20[-1] if len(sma_20) > 0 else 0
-            indicators['sma_50'] = sma_50[-1] if len(sma_50) > 0 else 0
-            
-            # MACD
-            macd, macd_signal, macd_hist = talib.MACD(close_prices)
-            indicators['macd'] = macd[-1] if len(macd) > 0 else 0
-            indicators['macd_signal'] = macd_signal[-1] if len(macd_signal) > 0 else 0
-            indicators['macd_hist'] = macd_hist[-1] if len(macd_hist) > 0 else 0
-            
-            # Bollinger Bands
-            bb_upper, bb_middle, bb_lower = talib.BBANDS(close_prices, timeperiod=20, nbdevup=2, nbdevdn=2)
-            if len(bb_upper) > 0 and len(bb_lower) > 0:
-                indicators['bb_upper'] = bb_upper[-1]
-                indicators['bb_middle'] = bb_middle[-1]
-                indicators['bb_lower'] = bb_lower[-1]
-                indicators['bb_position'] = (close_prices[-1] - bb_lower[-1]) / (bb_upper[-1] - bb_lower[-1])
+            indicators['rsi'] = _wilder_rsi(close_prices, 14)
+            
+            # Moving Averages - فقط مقدار آخر لازم است، پس میانگین کندل‌های انتهایی کافی است
+            # SMA20 همان خط میانی بولینگر است و یک بار محاسبه می‌شود
+            tail_20 = close_prices[-20:]
+            sma_20 = tail_20.mean()
+            indicators['sma_20'] = sma_20
+            indicators['sma_50'] = close_prices[-50:].mean()
+            
+            # MACD (12, 26, 9)
+            ema_slow = _ema(close_prices, 26)
+            # EMA سریع از همان کندلی شروع می‌شود که EMA کند (مشابه TA-Lib)
+            macd_line = _ema(close_prices[26 - 12:], 12) - ema_slow
+            macd_signal = _ema(macd_line, 9)
+            indicators['macd'] = macd_line[-1]
+            indicators['macd_signal'] = macd_signal[-1]
+            indicators['macd_hist'] = macd_line[-1] - macd_signal[-1]
+            
+            # Bollinger Bands - میانگین و انحراف معیار 20 کندل آخر (مشابه BBANDS با nbdev=2)
+            bb_std = tail_20.std(ddof=0)
+            indicators['bb_upper'] = sma_20 + 2 * bb_std
+            indicators['bb_middle'] = sma_20
+            indicators['bb_lower'] = sma_20 - 2 * bb_std
+            # در بازار بدون نوسان (یا داده NaN) عرض باند صفر است و موقعیت خنثی در نظر گرفته می‌شود
+            bb_width = indicators['bb_upper'] - indicators['bb_lower']
+            if bb_width > 1e-12:
+                indicators['bb_position'] = float(np.clip((close_prices[-1] - indicators['bb_lower']) / bb_width, 0.0, 1.0))
             else:
                 indicators['bb_position'] = 0.5
             
@@ -147,40 +439,33 @@ class MetalMarketAnalyzer:
             logging.error(f"خطا در محاسبه اندیکاتورها: {e}")
             return {}
     
-    def analyze_trend(self, data: pd.DataFrame) -> Dict:
+    def analyze_trend(self, data: OHLC) -> Dict:
         """تحلیل روند و سقف/کف‌ها"""
         if len(data) < 20:
             return {}
         
         try:
             # تحلیل 4 ساعت گذشته (16 کندل 15 دقیقه‌ای)
-            recent_data = data.tail(16)
-            highs = recent_data['High'].values
-            lows = recent_data['Low'].values
-            
-            # یافتن سقف و کف‌ها
-            higher_highs = 0
-            lower_highs = 0
-            higher_lows = 0
-            lower_lows = 0
-            
-            for i in range(1, len(highs)):
-                if highs[i] > highs[i-1]:
-                    higher_highs += 1
-                elif highs[i] < highs[i-1]:
-                    lower_highs += 1
-                    
-                if lows[i] > lows[i-1]:
-                    higher_lows += 1
-                elif lows[i] < lows[i-1]:
-                    lower_lows += 1
+            highs = data.high[-16:]
+            lows = data.low[-16:]
+            
+            # یافتن سقف و کف‌ها به صورت برداری
+            high_diff = np.diff(highs)
+            low_diff = np.diff(lows)
+            higher_highs = int(np.count_nonzero(high_diff > 0))
+            lower_highs = int(np.count_nonzero(high_diff < 0))
+            higher_lows = int(np.count_nonzero(low_diff > 0))
+            lower_lows = int(np.count_nonzero(low_diff < 0))
+            
+            # بیشترین امتیاز ممکن: هر مقایسه سقف و کف یک امتیاز
+            max_score = 2 * (len(highs) - 1)
             
             trend_analysis = {
                 'higher_highs': higher_highs,
                 'lower_highs': lower_highs,
                 'higher_lows': higher_lows,
                 'lower_lows': lower_lows,
-                'trend_strength': (higher_highs + higher_lows - lower_highs - lower_lows) / 30
+                'trend_strength': (higher_highs + higher_lows - lower_highs - lower_lows) / max_score
             }
             
             return trend_analysis
@@ -191,97 +476,32 @@ class MetalMarketAnalyzer:
     def get_signal_strength(self, indicators: Dict, trend_analysis: Dict) -> Tuple[str, float, str]:
         """محاسبه قدرت سیگنال"""
         try:
-            confirmation_count = 0
-            total_indicators = 5
-            
-            current_price = indicators.get('current_price', 0)
-            sma_20 = indicators.get('sma_20', 0)
-            sma_50 = indicators.get('sma_50', 0)
-            rsi = indicators.get('rsi', 50)
-            macd_hist = indicators.get('macd_hist', 0)
-            bb_position = indicators.get('bb_position', 0.5)
-            trend_strength = trend_analysis.get('trend_strength', 0)
-            
-            # تحلیل RSI
-            if rsi < 30:
-                rsi_signal = "خرید"
-                confirmation_count += 1
-            elif rsi > 70:
-                rsi_signal = "فروش"
-                confirmation_count += 1
-            else:
-                rsi_signal = "خنثی"
-            
-            # تحلیل موینگ اوریج
-            if sma_20 > sma_50 and current_price > sma_20:
-                ma_signal = "خرید"
-                confirmation_count += 1
-            elif sma_20 < sma_50 and current_price < sma_20:
-                ma_signal = "فروش"
-                confirmation_count += 1
-            else:
-                ma_signal = "خنثی"
-            
-            # تحلیل MACD
-            if macd_hist > 0:
-                macd_signal = "خرید"
-                confirmation_count += 1
-            elif macd_hist < 0:
-                macd_signal = "فروش"
-                confirmation_count += 1
-            else:
-                macd_signal = "خنثی"
-            
-            # تحلیل بولینگر باند
-            if bb_position < 0.2:
-                bb_signal = "خرید"
-                confirmation_count += 1
-            elif bb_position > 0.8:
-                bb_signal = "فروش"
-                confirmation_count += 1
-            else:
-                bb_signal = "خنثی"
-            
-            # تحلیل روند
-            if trend_strength > 0.1:
-                trend_signal = "خرید"
-                confirmation_count += 1
-            elif trend_strength < -0.1:
-                trend_signal = "فروش"
-                confirmation_count += 1
-            else:
-                trend_signal = "خنثی"
-            
-            # محاسبه درصد اطمینان
-            if confirmation_count == total_indicators:
-                confidence = 80
-            elif confirmation_count == total_indicators - 1:
-                confidence = 70
-            elif confirmation_count == total_indicators - 2:
-                confidence = 60
-            else:
-                confidence = 50
+            codes, direction, confidence = score_signals(
+                rsi=indicators.get('rsi', 50),
+                sma_20=indicators.get('sma_20', 0),
+                sma_50=indicators.get('sma_50', 0),
+                current_price=indicators.get('current_price', 0),
+                macd_hist=indicators.get('macd_hist', 0),
+                bb_position=indicators.get('bb_position', 0.5),
+                trend_strength=trend_analysis.get('trend_strength', 0)
+            )
+            confidence = int(confidence)
             
             # تعیین جهت کلی بازار
-            buy_signals = sum([1 for signal in [rsi_signal, ma_signal, macd_signal, bb_signal, trend_signal] if signal == "خرید"])
-            sell_signals = sum([1 for signal in [rsi_signal, ma_signal, macd_signal, bb_signal, trend_signal] if signal == "فروش"])
-            
-            if buy_signals > sell_signals:
+            if direction == Signal.BUY:
                 market_direction = "صعودی"
                 action = "خرید"
-            elif sell_signals > buy_signals:
+            elif direction == Signal.SELL:
                 market_direction = "نزولی"
                 action = "فروش"
             else:
                 market_direction = "رنج"
                 action = "انتظار"
             
+            # نام فارسی سیگنال‌ها فقط هنگام ساخت پیام استفاده می‌شود
             signals_detail = {
-                'RSI': rsi_signal,
-                'MA': ma_signal,
-                'MACD': macd_signal,
-                'Bollinger': bb_signal,
-                'Trend': trend_signal
+                name: Signal(code)
+                for name, code in zip(self.SIGNAL_INDICATORS, codes.tolist())
             }
             
             return market_direction, confidence, action, signals_detail
@@ -289,19 +509,27 @@ class MetalMarketAnalyzer:
             logging.error(f"خطا در محاسبه قدرت سیگنال: {e}")
             return "نامشخص", 0, "نامشخص", {}
     
-    def get_daily_summary(self) -> str:
+    def get_daily_summary(self, iran_time: Optional[datetime] = None) -> str:
         """گزارش روزانه قیمت فلزات"""
         try:
-            iran_time = self.get_iran_time()
-            message = "📊 گزارش روزانه فلزات 📊\n\n"
-            message += f"📅 تاریخ: {iran_time.strftime('%Y-%m-%d %H:%M')} (به وقت ایران)\n\n"
+            if iran_time is None:
+                iran_time = self.get_iran_time()
+            
+            parts = [
+                self.DAILY_HEADER,
+                "",
+                f"📅 تاریخ: {iran_time.strftime('%Y-%m-%d %H:%M')} (به وقت ایران)",
+                ""
+            ]
+            
+            # برای تغییر 30 روزه فقط اولین و آخرین قیمت لازم است، پس کندل روزانه کافی است
+            self._bulk_fetch('1mo', '1d')
             
             for metal_name, symbol in self.metals.items():
-                data_30d = self.get_metal_data(symbol, '1mo')
+                data_30d = self.get_metal_data(symbol, '1mo', '1d')
                 if data_30d is not None and len(data_30d) > 0:
-                    # استفاده از iloc به جای [] برای جلوگیری از هشدار
-                    current_price = data_30d['Close'].iloc[-1] if len(data_30d) > 0 else 0
-                    price_30d_ago = data_30d['Close'].iloc[0] if len(data_30d) > 0 else 0
+                    closes = data_30d.close
+                    current_price, price_30d_ago = closes[-1], closes[0]
                     
                     if price_30d_ago > 0:
                         change_percent = ((current_price - price_30d_ago) / price_30d_ago) * 100
@@ -310,22 +538,30 @@ class MetalMarketAnalyzer:
                     
                     change_emoji = "📈" if change_percent > 0 else "📉"
                     
-                    message += f"{metal_name.upper()}:\n"
-                    message += f"💰 قیمت فعلی: ${current_price:.2f}\n"
-                    message += f"{change_emoji} تغییر 30 روزه: {change_percent:+.2f}%\n\n"
+                    parts.append(f"{metal_name.upper()}:")
+                    parts.append(f"💰 قیمت فعلی: ${current_price:.2f}")
+                    parts.append(f"{change_emoji} تغییر 30 روزه: {change_percent:+.2f}%")
+                    parts.append("")
                 else:
-                    message += f"{metal_name.upper()}:\n"
-                    message += "⚠️ داده‌ای دریافت نشد\n\n"
+                    parts.append(f"{metal_name.upper()}:")
+                    parts.append("⚠️ داده‌ای دریافت نشد")
+                    parts.append("")
             
-            message += "🔄 به روزرسانی بعدی: 4 ساعت دیگر\n"
-            message += "#گزارش_روزانه #فلزات"
+            parts.append(self.DAILY_FOOTER)
             
-            return message
+            # ساخت پیام با یک join به جای الحاق‌های پیاپی رشته
+            return "\n".join(parts)
         except Exception as e:
             logging.error(f"خطا در تولید گزارش روزانه: {e}")
             return "خطا در تولید گزارش روزانه"
     
-    def analyze_metal(self, metal_name: str) -> str:
+    def _signal_emoji(self, signal: Signal, action: str) -> str:
+        """ایموجی موافقت سیگنال اندیکاتور با عمل پیشنهادی"""
+        if signal == Signal.NEUTRAL:
+            return "➖"
+        return "✅" if self.SIGNAL_NAMES[signal] == action else "❌"
+    
+    def analyze_metal(self, metal_name: str, iran_time: Optional[datetime] = None) -> str:
         """تحلیل کامل یک فلز"""
         try:
             symbol = self.metals.get(metal_name)
@@ -340,35 +576,33 @@ class MetalMarketAnalyzer:
             if not indicators:
                 return f"خطا در محاسبه اندیکاتورهای {metal_name}"
             
-            # استفاده از iloc به جای [] برای جلوگیری از هشدار
-            indicators['current_price'] = data['Close'].iloc[-1] if len(data) > 0 else 0
+            indicators['current_price'] = data.close[-1] if len(data) > 0 else 0
             
             trend_analysis = self.analyze_trend(data)
             
             market_direction, confidence, action, signals_detail = self.get_signal_strength(indicators, trend_analysis)
             
             # تولید پیام تحلیل
-            iran_time = self.get_iran_time()
-            message = f"🔍 تحلیل {metal_name.upper()} - تایم‌فریم 15 دقیقه\n\n"
-            message += f"💰 قیمت فعلی: ${indicators['current_price']:.2f}\n"
-            message += f"📊 جهت بازار: {market_direction}\n"
-            message += f"🎯 عمل پیشنهادی: {action}\n"
-            message += f"🛡️ اطمینان تحلیل: {confidence}%\n\n"
-            
-            message += "📈 جزئیات اندیکاتورها:\n"
-            for indicator_name, signal in signals_detail.items():
-                emoji = "✅" if signal == action else "➖" if signal == "خنثی" else "❌"
-                message += f"{emoji} {indicator_name}: {signal}\n"
-            
-            message += f"\n📊 RSI: {indicators.get('rsi', 0):.1f}"
-            message += f"\n📊 موقعیت در بولینگر: {indicators.get('bb_position', 0.5)*100:.1f}%"
-            message += f"\n💪 قدرت روند: {trend_analysis.get('trend_strength', 0)*100:.1f}%"
-            
-            message += f"\n\n⏰ زمان تحلیل: {iran_time.strftime('%H:%M')} (به وقت ایران)"
-            message += f"\n🔄 به روزرسانی بعدی: 4 ساعت دیگر"
-            message += f"\n#{metal_name}_تحلیل #سیگنال"
-            
-            return message
+            if iran_time is None:
+                iran_time = self.get_iran_time()
+            details = "".join(
+                f"\n{self._signal_emoji(signal, action)} {indicator_name}: {self.SIGNAL_NAMES[signal]}"
+                for indicator_name, signal in signals_detail.items()
+            )
+            
+            return self.ANALYSIS_TEMPLATE.format_map({
+                'metal_name': metal_name,
+                'metal_upper': metal_name.upper(),
+                'current_price': indicators['current_price'],
+                'market_direction': market_direction,
+                'action': action,
+                'confidence': confidence,
+                'details': details,
+                'rsi': indicators.get('rsi', 0),
+                'bb_position': indicators.get('bb_position', 0.5) * 100,
+                'trend_strength': trend_analysis.get('trend_strength', 0) * 100,
+                'time': iran_time.strftime('%H:%M')
+            })
         except Exception as e:
             logging.error(f"خطا در تحلیل {metal_name}: {e}")
             return f"خطا در تحلیل {metal_name}"
@@ -377,14 +611,14 @@ class MetalMarketAnalyzer:
         """ارسال پیام به تلگرام"""
         try:
             url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+            # پیام‌ها متن ساده هستند و نیازی به parse_mode ندارند
             payload = {
                 'chat_id': self.channel_id,
-                'text': message,
-                'parse_mode': 'HTML'
+                'text': message
             }
             
             logging.info(f"ارسال پیام به تلگرام (طول: {len(message)} کاراکتر)")
-            response = requests.post(url, data=payload, timeout=30)
+            response = self.session.post(url, data=payload, timeout=10)
             
             if response.status_code == 200:
                 logging.info("✅ پیام با موفقیت ارسال شد")
@@ -404,57 +638,67 @@ class MetalMarketAnalyzer:
             logging.error(f"🚨 خطای غیرمنتظره در ارسال پیام: {e}")
             return False
     
+    def _daily_summary_job(self, iran_time: datetime):
+        """ارسال گزارش روزانه"""
+        logging.info("📊 ارسال گزارش روزانه...")
+        daily_report = self.get_daily_summary(iran_time)
+        success = self.send_telegram_message(daily_report)
+        if success:
+            logging.info("✅ گزارش روزانه ارسال شد")
+        else:
+            logging.error("❌ خطا در ارسال گزارش روزانه")
+    
+    def _analysis_job(self, iran_time: datetime):
+        """تحلیل و ارسال پیام همه فلزات"""
+        logging.info("🔍 شروع تحلیل فلزات...")
+        
+        # دریافت داده هر دو فلز با یک درخواست
+        self._bulk_fetch('5d')
+        
+        # تحلیل هم‌زمان فلزات
+        with ThreadPoolExecutor(max_workers=len(self.metals)) as executor:
+            futures = {name: executor.submit(self.analyze_metal, name, iran_time) for name in self.metals}
+            analyses = {name: future.result() for name, future in futures.items()}
+        
+        # اگر همه تحلیل‌ها در یک پیام جا شوند با یک درخواست ارسال می‌شوند
+        combined = self.MESSAGE_SEPARATOR.join(analyses.values())
+        if len(combined) <= self.COMBINED_MESSAGE_LIMIT:
+            if self.send_telegram_message(combined):
+                logging.info(f"✅ تحلیل {', '.join(analyses)} در یک پیام ارسال شد")
+            else:
+                logging.error("❌ خطا در ارسال تحلیل فلزات")
+            return
+        
+        # در غیر این صورت هر تحلیل جداگانه (به همان ترتیب) ارسال می‌شود
+        for metal_name, analysis in analyses.items():
+            if self.send_telegram_message(analysis):
+                logging.info(f"✅ تحلیل {metal_name} ارسال شد")
+            else:
+                logging.error(f"❌ خطا در ارسال تحلیل {metal_name}")
+    
     def run_analysis(self):
         """اجرای تحلیل اصلی"""
         try:
             logging.info("🚀 شروع تحلیل...")
             
-            # دریافت زمان ایران
+            # زمان ایران یک بار خوانده می‌شود و به همه مراحل اجرا داده می‌شود
             iran_time = self.get_iran_time()
             current_hour = iran_time.hour
             current_minute = iran_time.minute
             
             logging.info(f"🕒 زمان فعلی ایران: {current_hour}:{current_minute:02d}")
             
-            if not self.should_analyze():
-                logging.info("⏸️ تحلیل لغو شد - بازار تعطیل است")
+            # انتخاب کار از جدول زمان‌بندی؛ خارج از زمان‌های تعریف‌شده کاری انجام نمی‌شود
+            job = self.schedule.get((current_hour, current_minute // 30 * 30))
+            if job is None:
+                logging.info(f"⏰ ساعت {current_hour}:{current_minute:02d} برای تحلیل نیست. ساعات تحلیل: {list(self.ANALYSIS_HOURS)}")
                 return
             
-            # گزارش روزانه ساعت 4:30 صبح به وقت ایران
-            if current_hour == 4 and current_minute >= 30:
-                logging.info("📊 ارسال گزارش روزانه...")
-                daily_report = self.get_daily_summary()
-                success = self.send_telegram_message(daily_report)
-                if success:
-                    logging.info("✅ گزارش روزانه ارسال شد")
-                else:
-                    logging.error("❌ خطا در ارسال گزارش روزانه")
+            if not self.should_analyze(iran_time):
+                logging.info("⏸️ تحلیل لغو شد - بازار تعطیل است")
+                return
             
-            # تحلیل هر 4 ساعت از 5 صبح به وقت ایران
-            analysis_hours = [5, 9, 13, 17, 21]
-            if current_hour in analysis_hours:
-                logging.info("🔍 شروع تحلیل فلزات...")
-                
-                # تحلیل طلا
-                gold_analysis = self.analyze_metal('gold')
-                success_gold = self.send_telegram_message(gold_analysis)
-                if success_gold:
-                    logging.info("✅ تحلیل طلا ارسال شد")
-                else:
-                    logging.error("❌ خطا در ارسال تحلیل طلا")
-                
-                # فاصله بین ارسال پیام‌ها
-                time.sleep(5)
-                
-                # تحلیل نقره
-                silver_analysis = self.analyze_metal('silver')
-                success_silver = self.send_telegram_message(silver_analysis)
-                if success_silver:
-                    logging.info("✅ تحلیل نقره ارسال شد")
-                else:
-                    logging.error("❌ خطا در ارسال تحلیل نقره")
-            else:
-                logging.info(f"⏰ ساعت {current_hour}:{current_minute:02d} برای تحلیل نیست. ساعات تحلیل: {analysis_hours}")
+            job(iran_time)
             
             logging.info("🎉 تحلیل با موفقیت تکمیل شد")
             
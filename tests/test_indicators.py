@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from metal_analyzer import OHLC, MetalMarketAnalyzer, _wilder_rsi
+
+talib = pytest.importorskip("talib")
+
+
+def _random_walk(n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 2000.0 + np.cumsum(rng.normal(0.0, 2.0, n))
+
+
+def _indicators(close: np.ndarray) -> dict:
+    ones = np.ones_like(close)
+    data = OHLC.from_arrays(np.arange(len(close)), close, close + 1, close - 1, close, ones)
+    # calculate_indicators فقط به ثابت‌های کلاس نیاز دارد
+    return MetalMarketAnalyzer.calculate_indicators(object.__new__(MetalMarketAnalyzer), data)
+
+
+@pytest.mark.parametrize("n", [50, 60, 200, 480])
+@pytest.mark.parametrize("seed", range(20))
+def test_rsi_matches_talib(n, seed):
+    close = _random_walk(n, seed)
+    assert _wilder_rsi(close, 14) == pytest.approx(talib.RSI(close, 14)[-1], abs=1e-9)
+
+
+@pytest.mark.parametrize("n", [50, 60, 200, 480])
+@pytest.mark.parametrize("seed", range(20))
+def test_macd_matches_talib(n, seed):
+    close = _random_walk(n, seed)
+    indicators = _indicators(close)
+    # اندیکاتورها روی INDICATOR_LOOKBACK کندل آخر محاسبه می‌شوند
+    macd, signal, hist = talib.MACD(close[-MetalMarketAnalyzer.INDICATOR_LOOKBACK:], 12, 26, 9)
+    assert indicators['macd'] == pytest.approx(macd[-1], abs=1e-9)
+    assert indicators['macd_signal'] == pytest.approx(signal[-1], abs=1e-9)
+    assert indicators['macd_hist'] == pytest.approx(hist[-1], abs=1e-9)
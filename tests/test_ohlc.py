@@ -0,0 +1,33 @@
+import numpy as np
+
+from metal_analyzer import OHLC
+
+
+def test_merge_buckets_folds_live_row_into_its_candle():
+    # دو کندل 15 دقیقه‌ای و ردیف قیمت لحظه‌ای داخل بازه کندل دوم
+    data = OHLC.from_arrays(
+        [900 * 10, 900 * 11, 900 * 11 + 437],
+        [10.0, 11.0, 11.5], [12.0, 13.0, 14.0], [9.0, 10.5, 10.0],
+        [11.0, 12.0, 13.5], [100.0, 50.0, 5.0]
+    )
+    merged = data.merge_buckets(900)
+    np.testing.assert_array_equal(merged.ts, [9000, 9900])
+    np.testing.assert_array_equal(merged.open, [10.0, 11.0])
+    np.testing.assert_array_equal(merged.high, [12.0, 14.0])
+    np.testing.assert_array_equal(merged.low, [9.0, 10.0])
+    np.testing.assert_array_equal(merged.close, [11.0, 13.5])
+    np.testing.assert_array_equal(merged.volume, [100.0, 55.0])
+
+
+def test_merge_buckets_keeps_distinct_candles():
+    data = OHLC.from_arrays([0, 900, 1800], [1.0] * 3, [2.0] * 3, [0.5] * 3, [1.5] * 3, [1.0] * 3)
+    assert data.merge_buckets(900) is data
+
+
+def test_merge_buckets_uses_exchange_day_for_daily_bars():
+    # کندل روزانه ساعت 04:00 UTC (نیمه‌شب نیویورک) و ردیف لحظه‌ای ساعت 02:00 UTC روز بعد
+    day = 86400
+    data = OHLC.from_arrays([day + 4 * 3600, 2 * day + 2 * 3600], [1.0, 1.2], [2.0, 2.5],
+                            [0.5, 1.0], [1.5, 2.2], [1.0, 1.0])
+    assert len(data.merge_buckets(day, -4 * 3600)) == 1
+    assert len(data.merge_buckets(day)) == 2